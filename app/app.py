@@ -1,6 +1,6 @@
 import argparse
 import logging as log
-import json
+import orjson
 import os
 import shutil
 from typing import Dict, Any
@@ -13,8 +13,8 @@ from .file_manager import (
 )
 from .command_generator import CommandGenerator
 from .command_executor import CommandExecutor
+from .response_cache import ResponseCache
 from . import utils
-import openai
 
 def run_toast_app(args: argparse.Namespace, config: Dict[str, Any]) -> int:
     """
@@ -103,15 +103,14 @@ def run_toast_app(args: argparse.Namespace, config: Dict[str, Any]) -> int:
         if found_files:
             max_files_to_list = 15
             files_to_mention_abs = found_files[:max_files_to_list]
-            relative_files = []
-            for f_abs in files_to_mention_abs:
-                try:
-                    rel_path = os.path.relpath(f_abs, current_workdir)
-                    relative_files.append(rel_path)
-                except ValueError:
-                    relative_files.append(f_abs)
+            # Strip the normalized CWD prefix once instead of calling os.path.relpath per file
+            cwd_prefix = os.path.join(os.path.normpath(current_workdir), "")
+            relative_files = [
+                f_abs[len(cwd_prefix):] if f_abs.startswith(cwd_prefix) else f_abs
+                for f_abs in files_to_mention_abs
+            ]
             system_context["detected_files_in_directory"] = files_to_mention_abs
-            file_list_str = ", ".join([f"'{f}'" for f in relative_files])
+            file_list_str = ", ".join(f"'{f}'" for f in relative_files)
             message = f"Found media files in the current directory ('{current_workdir}'): {file_list_str}."
             if len(found_files) > max_files_to_list:
                 message += f" (and {len(found_files) - max_files_to_list} more...)"
@@ -133,14 +132,27 @@ def run_toast_app(args: argparse.Namespace, config: Dict[str, Any]) -> int:
         # Use the model specified in the config
         llm_model = config.get("llm_model", "gpt-4o-mini")  # Fallback just in case
         logger.info(f"Using LLM model: {llm_model}")
+        llm_temperature = float(config.get("llm_temperature", 0.1))
+        response_cache = None
+        # The cache is only consulted for deterministic (temperature 0) requests,
+        # so don't create the cache directory or database otherwise.
+        if config.get("response_cache", True) and llm_temperature == 0:
+            try:
+                response_cache = ResponseCache()
+            except Exception as e:
+                logger.warning(f"Could not open LLM response cache, continuing without it: {e}", exc_info=args.verbose)
         # API key is already set globally by main.py
-        command_generator = CommandGenerator(model=llm_model)
+        command_generator = CommandGenerator(model=llm_model, temperature=llm_temperature, cache=response_cache)
         command_executor = CommandExecutor()
     except Exception as e:
         logger.error("Failed to instantiate core components:", exc_info=args.verbose)
         utils.eprint(f"[ERROR] Failed to set up core components: {e}")
         return 1
 
+    # openai is imported here rather than at module level to keep CLI startup light;
+    # it is only needed to recognize API errors in the loop below.
+    import openai
+
     # --- Interaction Loop ---
     conversation_history = []
     current_user_prompt = user_query_str
@@ -174,12 +186,12 @@ def run_toast_app(args: argparse.Namespace, config: Dict[str, Any]) -> int:
 
             # --- 2. Parse Response ---
             try:
-                parsed_response = json.loads(cleaned_json)
+                parsed_response = orjson.loads(cleaned_json)
                 explanation_data = parsed_response.get("explanation", "No explanation provided.")
                 command_to_execute = parsed_response.get("command", "").strip()
                 last_generated_command = command_to_execute
                 conversation_history.append({"role": "assistant", "content": cleaned_json})
-            except json.JSONDecodeError as e:
+            except orjson.JSONDecodeError as e:
                 logger.error(f"Failed to parse JSON response from LLM: {e}", exc_info=args.verbose)
                 logger.error(f"Raw response was: {raw_response}")
                 current_user_prompt = (
@@ -268,6 +280,8 @@ def run_toast_app(args: argparse.Namespace, config: Dict[str, Any]) -> int:
             break
 
     # --- Loop Finished ---
+    command_generator.close()  # Release pooled API connections and the response cache
+
     if success:
         logger.info("Pixel Toaster finished successfully.")
         return 0
@@ -2,38 +2,101 @@ import subprocess
 import shlex
 import time
 import logging as log
-from typing import Tuple, Union, List
+from typing import Tuple, Union, List, Deque, TextIO
 import platform
 import shutil
+import functools
+import os
+import random
+import re
+import threading
+from collections import deque
+
+# Leading keywords that indicate a shell construct (matched case-insensitively)
+_SHELL_KEYWORD_PREFIXES = ('for ', 'while ', 'if ', 'case ')
+# Single characters that always imply shell interpretation ('&&' is checked separately)
+_SHELL_OPERATOR_CHARS = frozenset(';|><`')
+# Failure output that indicates a transient problem worth retrying as-is
+_RETRYABLE_PATTERNS = tuple(re.compile(p, re.IGNORECASE) for p in (
+    r"Connection reset",
+    r"Temporary failure",
+    r"Resource temporarily unavailable",
+    # ffmpeg's strerror text for AVERROR_HTTP_SERVER_ERROR / AVERROR_HTTP_TOO_MANY_REQUESTS,
+    # plus the status line logged by its http protocol.
+    r"Server returned 5XX",
+    r"Server returned 429 Too Many Requests",
+    r"HTTP error 5\d\d",
+))
+
+
+@functools.lru_cache(maxsize=64)
+def _which(name: str, path: str) -> Union[str, None]:
+    """
+    Memoized shutil.which. Keyed on PATH as well as the name so that a changed
+    PATH is looked up afresh instead of returning a stale result.
+    """
+    return shutil.which(name, path=path) or None
+
+
+# Execution limits for run_command
+_COMMAND_TIMEOUT = 300  # Seconds
+_OUTPUT_TAIL_LINES = 4096  # Most recent output lines kept for error analysis
+
+
+def _drain_output(stream: TextIO, tail: Deque[str]) -> None:
+    """Reads `stream` line by line into the bounded `tail` buffer until EOF."""
+    with stream:
+        for line in stream:
+            tail.append(line.rstrip("\n"))
+
 
 class CommandExecutor:
     def __init__(self, max_retries: int = 2, verbose: bool = False):
         self.max_retries = max_retries
         self.verbose = verbose
 
-    def _looks_like_shell_script(self, command: str) -> bool:
+    @staticmethod
+    @functools.lru_cache(maxsize=128)
+    def _looks_like_shell_script(command: str) -> bool:
         """
         Basic heuristic to check if a command string likely requires shell interpretation.
         Checks for shell keywords, loops, pipes, redirects, variable expansion etc.
         This is not exhaustive but covers common cases generated by the LLM.
+
+        Scans the command once and is memoized, since retries re-check the same string.
         """
-        command_lower = command.lower().strip()
         # Keywords often starting a command requiring shell=True
-        if command_lower.startswith(('for ', 'while ', 'if ', 'case ')):
-            return True
-        # Common shell operators indicating complexity
-        if any(op in command for op in [';', '&&', '||', '|', '>', '<', '`']):
+        if command.lstrip().lower().startswith(_SHELL_KEYWORD_PREFIXES):
             return True
+
+        has_brace = False
+        last_dollar = -1
+        percent_positions: List[int] = []  # First two '%' positions, for %VAR% on Windows
+        prev = ""
+        for i, ch in enumerate(command):
+            # Common shell operators indicating complexity (;, |, ||, >, <, `, &&)
+            if ch in _SHELL_OPERATOR_CHARS or (ch == "&" and prev == "&"):
+                return True
+            if ch == "$":
+                last_dollar = i
+            elif ch == "{":
+                has_brace = True
+            elif ch == "%" and len(percent_positions) < 2:
+                percent_positions.append(i)
+            prev = ch
+
         # Shell variable expansions (simple check)
         # Match ${...} or $VAR type patterns (but avoid simple $ signs)
-        if '$' in command and ('{' in command or command.split('$')[-1].split()[0].isalnum()):
-             return True
-        # Match %VAR% on Windows
-        if '%' in command and platform.system() == "Windows":
-             # Basic check for %...% pattern
-             parts = command.split('%')
-             if len(parts) > 2 and parts[1].isalnum():  # Check if there's something between %
-                 return True
+        if last_dollar != -1:
+            if has_brace:
+                return True
+            after_dollar = command[last_dollar + 1:].split(None, 1)
+            if after_dollar and after_dollar[0].isalnum():
+                return True
+        # Match %VAR% on Windows: something alphanumeric between the first two '%'
+        if len(percent_positions) == 2 and platform.system() == "Windows":
+            if command[percent_positions[0] + 1:percent_positions[1]].isalnum():
+                return True
 
         # Default to False if none of the above are strongly indicative
         return False
@@ -59,45 +122,54 @@ class CommandExecutor:
                 if not command_to_run:
                     return False, "Empty command after shlex.split"
                 # Check executable existence only when not using shell=True implicitly
-                executable_path = shutil.which(command_to_run[0])
+                executable_path = _which(command_to_run[0], os.environ.get("PATH", os.defpath))
                 if not executable_path:
                      error_prefix = f"Error: Command executable '{command_to_run[0]}' not found in PATH."
                      log.error(error_prefix, exc_info=self.verbose)
-                     # Let subprocess.run raise the FileNotFoundError for consistency
+                     # Let subprocess.Popen raise the FileNotFoundError for consistency
                 else:
                      # Optionally log the found path
                      log.debug(f"Found executable for '{command_to_run[0]}': {executable_path}")
 
-            # Execute using subprocess.run
-            completed_process = subprocess.run(
+            # Execute with stderr merged into stdout. Output is drained line by line on a
+            # background thread into a bounded buffer, so long ffmpeg runs use constant
+            # memory and never block on a full pipe; only the tail is kept for analysis.
+            process = subprocess.Popen(
                 command_to_run,
                 shell=use_shell,  # Set based on detection
-                capture_output=True,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                bufsize=1,  # Line buffered
                 text=True,
-                check=False,  # We check returncode manually
-                timeout=300  # Add a timeout (e.g., 5 minutes) for safety
+                errors="replace"
             )
+            output_tail: Deque[str] = deque(maxlen=_OUTPUT_TAIL_LINES)
+            drain_thread = threading.Thread(target=_drain_output, args=(process.stdout, output_tail), daemon=True)
+            drain_thread.start()
+            try:
+                returncode = process.wait(timeout=_COMMAND_TIMEOUT)  # Timeout (5 minutes) for safety
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+                raise
+            finally:
+                # Bounded join: with shell=True a killed shell's children may keep the pipe open
+                drain_thread.join(timeout=5)
 
-            # Combine stdout and stderr for output context
-            combined_output = ""
-            if completed_process.stdout:
-                 combined_output += f"Stdout:\n{completed_process.stdout.strip()}\n"
-            if completed_process.stderr:
-                 combined_output += f"Stderr:\n{completed_process.stderr.strip()}"
-            combined_output = combined_output.strip()
+            combined_output = "\n".join(output_tail).strip()
 
-            if completed_process.returncode == 0:
+            if returncode == 0:
                 log.debug(f"Command successful. Output:\n{combined_output or '<No output>'}")
                 return True, combined_output
             else:
-                error_message = f"Command failed with exit code {completed_process.returncode}."
+                error_message = f"Command failed with exit code {returncode}."
                 # Prepend specific error if found earlier
                 if error_prefix:
                     error_message = f"{error_prefix}\n{error_message}"
                 log.error(error_message, exc_info=self.verbose)
                 if combined_output:
                     log.error(f"Output:\n{combined_output}", exc_info=self.verbose)
-                # Return the combined output which includes stderr for error analysis
+                # Return the output tail (stdout + stderr) for error analysis
                 return False, f"{error_message}\n{combined_output}"
 
         except FileNotFoundError as e:
@@ -109,7 +181,7 @@ class CommandExecutor:
             log.error(err_msg, exc_info=self.verbose)
             return False, err_msg
         except subprocess.TimeoutExpired:
-            err_msg = f"Error: Command timed out after 300 seconds.\nCommand: {command}"
+            err_msg = f"Error: Command timed out after {_COMMAND_TIMEOUT} seconds.\nCommand: {command}"
             log.error(err_msg, exc_info=self.verbose)
             return False, err_msg
         except Exception as e:
@@ -119,7 +191,7 @@ class CommandExecutor:
 
     def execute_with_retries(self, command: str) -> Tuple[bool, str]:
         """
-        Execute the command, retrying on failure with exponential backoff.
+        Execute the command, retrying transient failures with jittered exponential backoff.
         Confirmation and dry_run are handled in the main loop now.
         """
         attempt = 0
@@ -136,26 +208,23 @@ class CommandExecutor:
                 return True, output  # Return success and any output
             else:
                 last_error_output = output  # Keep track of the last error
-                # Don't retry immediately if it's a clear structural or setup error
-                # or a shell pattern matching error
-                no_retry_errors = [
-                    "Error splitting command string",
-                    "executable not found",
-                    "FileNotFoundError",
-                    "no matches found",
-                    "timed out"  # Don't retry timeouts immediately
-                ]
-                if any(err_text in output for err_text in no_retry_errors):
+                # Only retry failures that look transient (e.g., network hiccups while
+                # reading/writing remote media). Everything else - bad flags, missing
+                # files, shell pattern errors, timeouts - would just fail again and is
+                # better handed back to the LLM for a corrected command.
+                if not any(pattern.search(output) for pattern in _RETRYABLE_PATTERNS):
                      log.warning(
-                         f"Command failed due to specific error, not retrying execution. Error text contained: {output[:200]}...",
+                         f"Command failed with a non-transient error, not retrying execution. Error text: {output[:200]}...",
                          exc_info=self.verbose
                      )
                      break  # Exit retry loop
 
-                # If retries remain, wait and log
+                # If retries remain, wait and log. Jitter the exponential backoff so
+                # concurrent instances don't retry in lockstep.
                 if attempt < max_exec_retries:
-                    sleep_time = 2 ** attempt
-                    log.warning(f"Command failed. Retrying execution in {sleep_time} seconds...", exc_info=self.verbose)
+                    base_delay = 2 ** attempt
+                    sleep_time = random.uniform(0.5 * base_delay, 1.5 * base_delay)
+                    log.warning(f"Command failed. Retrying execution in {sleep_time:.1f} seconds...", exc_info=self.verbose)
                     time.sleep(sleep_time)
                 else:
                      log.error(f"Command failed after maximum {max_exec_retries} execution retries.", exc_info=self.verbose)
@@ -1,16 +1,274 @@
 import os
-import json
 import re
-import logging as log
-import openai
+import shlex
+import asyncio
+import hashlib
+import inspect
+import functools
+import importlib.util
+import logging
+import string
+import orjson
 from pathlib import Path
+from typing import Optional, TYPE_CHECKING
 import sys # <-- Import sys module
 
+from .file_manager import VIDEO_EXTENSIONS
+from .response_cache import ResponseCache
+
+if TYPE_CHECKING:
+    # openai (and httpx, which it pulls in) is heavy to import, so it is only
+    # imported at runtime when the first API client is created.
+    import openai
+
 # Initialize logger for this module
-log = log.getLogger(__name__)
+log = logging.getLogger(__name__)
 
 # Path to the system prompt template file is determined dynamically in __init__
 
+# system_context fields that feed the system prompt; used to build hashable cache keys.
+# The static fields describe the machine and stay the same across runs, so the system
+# prompt formatted from them is a byte-stable prefix that providers can cache.
+# The remaining fields describe the working directory and go in a separate message.
+_STATIC_PROMPT_FIELDS = (
+    "os_info", "os_type", "shell", "ffmpeg_version", "ffmpeg_executable_path",
+)
+_PROMPT_CONTEXT_FIELDS = _STATIC_PROMPT_FIELDS + (
+    "current_directory", "explicit_input_file", "detected_files_in_directory",
+    "file_context_message",
+)
+
+# Connection pool settings for the shared OpenAI HTTP clients. HTTP/2 is used when the
+# optional 'h2' package is installed (httpx[http2]); otherwise httpx falls back to HTTP/1.1.
+_HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+_HTTP_MAX_KEEPALIVE_CONNECTIONS = 16
+_HTTP_TIMEOUT = 60.0
+
+# Retries for failed API requests (429s, 5xx, connection errors). The OpenAI SDK
+# applies these itself, honoring retry-after-ms / Retry-After with jittered backoff.
+_LLM_MAX_RETRIES = 2
+
+# Built-in intents answered without an LLM call: (pattern, ffmpeg options, output
+# extension or None to keep the input's, explanation). Patterns must match the whole
+# normalized prompt (lowercased, input filename removed), so anything more specific
+# ("extract the audio as mp3") still goes to the LLM.
+_BUILTIN_INTENTS = (
+    (
+        re.compile(r"(?:please )?extract (?:the )?audio(?: track)?(?: from(?: (?:this|the|my) (?:video|file))?)?"),
+        "-vn -c:a aac -b:a 192k",
+        ".m4a",
+        ["-vn: Drop the video stream.", "-c:a aac -b:a 192k: Encode the audio as 192 kbps AAC into an .m4a file."],
+    ),
+    (
+        re.compile(r"(?:please )?convert(?: (?:it|this|the video|this video))?(?: from \w+)? to(?: an?)? mp4"),
+        "-c:v libx264 -c:a aac -movflags +faststart",
+        ".mp4",
+        ["-c:v libx264: Encode the video as H.264.", "-c:a aac: Encode the audio as AAC.",
+         "-movflags +faststart: Move the index to the start of the file for faster playback start."],
+    ),
+    (
+        re.compile(r"(?:please )?(?:make|create|convert (?:it|this) to|scale (?:it |this )?to|resize (?:it |this )?to)"
+                   r"(?: an?)? 720p(?: version| copy)?(?: of(?: (?:it|this|the video))?)?"),
+        "-vf scale=-2:720 -c:a copy",
+        None,
+        ["-vf scale=-2:720: Scale to 720 pixels high, keeping the aspect ratio (width rounded to an even number).",
+         "-c:a copy: Copy the audio stream without re-encoding."],
+    ),
+)
+
+# Header for the second (per-directory) system message.
+_WORKING_CONTEXT_HEADER = "WORKING DIRECTORY CONTEXT:\n- Current Directory: {current_directory}"
+
+
+def _compile_template(template: str) -> tuple:
+    """
+    Pre-parses a str.format-style template into (literal, field_name, format_spec)
+    chunks, so that rendering does not re-parse the template each time.
+
+    Raises:
+        ValueError: If the template is malformed or uses a '!conversion'.
+    """
+    chunks = []
+    for literal, field_name, format_spec, conversion in string.Formatter().parse(template):
+        if conversion:
+            raise ValueError(f"Unsupported conversion '!{conversion}' on template field '{field_name}'.")
+        chunks.append((literal, field_name, format_spec or ""))
+    return tuple(chunks)
+
+
+def _render_template(chunks: tuple, values: dict[str, str]) -> str:
+    """
+    Renders chunks produced by `_compile_template`. Like str.format, raises
+    KeyError if a field is missing from `values`.
+    """
+    parts = []
+    for literal, field_name, format_spec in chunks:
+        parts.append(literal)
+        if field_name is not None:
+            value = values[field_name]
+            parts.append(format(value, format_spec) if format_spec else str(value))
+    return "".join(parts)
+
+
+def _ctx_key(system_context: dict[str, str], fields: tuple = _PROMPT_CONTEXT_FIELDS) -> tuple:
+    """
+    Freezes the given fields of `system_context` into a hashable tuple of
+    (name, value) pairs. Missing fields are omitted so `dict(key).get(...)` keeps
+    the same defaults as the original dictionary.
+    """
+    return tuple(
+        (name, tuple(value) if isinstance(value, list) else value)
+        for name in fields
+        if (value := system_context.get(name)) is not None
+    )
+
+
+def _cached_llm_call(call_llm_api):
+    """
+    Decorator for `CommandGenerator._call_llm_api` (and its async counterpart)
+    that consults the instance's response cache before hitting the network, and
+    applies `_finalize_content` to fresh responses after deciding whether to cache them.
+
+    The cache key is a BLAKE2b hash of the canonicalized request (model,
+    temperature, messages). Only deterministic requests (temperature == 0) are
+    cached; sampled responses always go to the API.
+    """
+    def cache_key(self, messages: list[dict[str, str]], model: str) -> Optional[str]:
+        if self.cache is None or self.temperature > 0:
+            return None
+        # orjson output is compact, and OPT_SORT_KEYS makes it canonical
+        return hashlib.blake2b(
+            orjson.dumps(
+                {"m": model, "t": self.temperature, "msgs": messages},
+                option=orjson.OPT_SORT_KEYS,
+            )
+        ).hexdigest()
+
+    def lookup(self, key: str) -> Optional[str]:
+        cached = self.cache.get(key)
+        if cached is not None:
+            log.debug(f"LLM response cache hit (key: {key[:16]}...)")
+        return cached
+
+    def store(self, key: str, content: str) -> None:
+        # Only cache real model output; empty, truncated or unparsable responses
+        # must not be replayed on every later identical request.
+        if _is_complete_json_response(content):
+            self.cache.set(key, content)
+        else:
+            log.debug("Not caching LLM response: no complete JSON object in content.")
+
+    if inspect.iscoroutinefunction(call_llm_api):
+        @functools.wraps(call_llm_api)
+        async def async_wrapper(self, messages: list[dict[str, str]], model: Optional[str] = None) -> str:
+            model = model or self.model
+            key = cache_key(self, messages, model)
+            cached = lookup(self, key) if key is not None else None
+            if cached is not None:
+                return cached
+            content = await call_llm_api(self, messages, model)
+            if key is not None:
+                store(self, key, content)
+            return self._finalize_content(content)
+
+        return async_wrapper
+
+    @functools.wraps(call_llm_api)
+    def wrapper(self, messages: list[dict[str, str]], model: Optional[str] = None) -> str:
+        model = model or self.model
+        key = cache_key(self, messages, model)
+        cached = lookup(self, key) if key is not None else None
+        if cached is not None:
+            return cached
+        content = call_llm_api(self, messages, model)
+        if key is not None:
+            store(self, key, content)
+        return self._finalize_content(content)
+
+    return wrapper
+
+
+class _JsonObjectScanner:
+    """
+    Incrementally tracks brace depth over streamed text to detect when the
+    outermost JSON object is complete. Braces inside string literals (including
+    escaped quotes) are ignored.
+    """
+
+    def __init__(self):
+        self.depth = 0
+        self.started = False
+        self.in_string = False
+        self.escaped = False
+
+    def feed(self, text: str, start: int = 0) -> int:
+        """
+        Consumes `text` from index `start`. Returns the index in `text` of the brace
+        that closes the outermost object, or -1 if it has not closed yet.
+        """
+        for i in range(start, len(text)):
+            ch = text[i]
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif ch == "\\":
+                    self.escaped = True
+                elif ch == '"':
+                    self.in_string = False
+            elif ch == '"':
+                if self.started:
+                    self.in_string = True
+            elif ch == "{":
+                self.depth += 1
+                self.started = True
+            elif ch == "}" and self.started:
+                self.depth -= 1
+                if self.depth == 0:
+                    return i
+        return -1
+
+
+def _extract_json_object(text: str) -> Optional[str]:
+    """
+    Returns the first balanced top-level JSON object in `text` in a single forward
+    scan, ignoring braces inside string literals and anything after the object.
+    Returns None if `text` contains no '{'. An unterminated object is returned
+    as-is from its opening brace so that parsing reports the error.
+    """
+    start = text.find("{")
+    if start == -1:
+        return None
+    end = _JsonObjectScanner().feed(text, start)
+    return text[start:end + 1] if end != -1 else text[start:]
+
+
+def _consume_delta(buf: list[str], scanner: _JsonObjectScanner, chunk) -> bool:
+    """
+    Appends a streamed completion chunk's text to `buf`. Returns True once the
+    outermost JSON object has closed and the rest of the stream can be skipped.
+    """
+    if not chunk.choices:
+        return False
+    delta = chunk.choices[0].delta.content or ""
+    buf.append(delta)
+    return scanner.feed(delta) != -1
+
+
+def _is_complete_json_response(text: str) -> bool:
+    """Returns True if `text` contains a complete, parsable top-level JSON object."""
+    start = text.find("{")
+    if start == -1:
+        return False
+    end = _JsonObjectScanner().feed(text, start)
+    if end == -1:
+        return False
+    try:
+        orjson.loads(text[start:end + 1])
+    except orjson.JSONDecodeError:
+        return False
+    return True
+
+
 class CommandGenerator:
     """
     Generates FFmpeg commands using an LLM based on user prompts and system context.
@@ -19,7 +277,8 @@ class CommandGenerator:
     and interacts with the OpenAI API to produce a command string and explanation in JSON format.
     """
 
-    def __init__(self, model: str = "gpt-4o-mini", temperature: float = 0.1):
+    def __init__(self, model: str = "gpt-4o-mini", temperature: float = 0.1,
+                 cache: Optional[ResponseCache] = None):
         """
         Initializes the CommandGenerator.
 
@@ -27,9 +286,16 @@ class CommandGenerator:
             model: The name of the OpenAI model to use (e.g., "gpt-4o-mini").
                    Passed from configuration.
             temperature: The sampling temperature for the LLM.
+            cache: Optional response cache. When provided and temperature is 0,
+                   identical requests are answered from the cache.
         """
         self.model = model
         self.temperature = temperature
+        self.cache = cache
+        self._intents = list(_BUILTIN_INTENTS)  # Rule-based fast path (see _match_intent)
+        self._client: Optional["openai.OpenAI"] = None  # Created on first sync call (see _get_client)
+        self._aclient: Optional["openai.AsyncOpenAI"] = None  # Created on first async call (see _get_async_client)
+        self._aclient_loop: Optional[asyncio.AbstractEventLoop] = None  # Loop the async client's pool belongs to
         prompt_path = None # Initialize prompt_path
 
         try:
@@ -55,6 +321,8 @@ class CommandGenerator:
             log.debug(f"Attempting to load system prompt from resolved path: {prompt_path}")
             with open(prompt_path, 'r', encoding='utf-8') as f:
                 self.system_prompt_template = f.read()
+            # Parse the template's {field} markers once; rendering is then plain concatenation
+            self._compiled_prompt = _compile_template(self.system_prompt_template)
             log.debug(f"Successfully loaded system prompt template from {prompt_path}")
 
         except FileNotFoundError:
@@ -76,7 +344,6 @@ class CommandGenerator:
         log.debug(f"CommandGenerator initialized with model: {self.model}, temperature: {self.temperature}")
 
     # --- Helper methods (_format_file_context, _prepare_llm_messages, _call_llm_api) ---
-    # These remain unchanged from the previous version where they were refactored.
 
     def _format_file_context(self, system_context: dict[str, str]) -> str:
         """
@@ -88,6 +355,16 @@ class CommandGenerator:
         Returns:
             A formatted string describing the file context.
         """
+        return self._format_file_context_cached(_ctx_key(system_context))
+
+    @staticmethod
+    @functools.lru_cache(maxsize=32)
+    def _format_file_context_cached(ctx_key: tuple) -> str:
+        """
+        Memoized implementation of `_format_file_context`, keyed on the frozen
+        context so unchanged turns reuse the formatted string.
+        """
+        system_context = dict(ctx_key)
         file_context_lines = ["\nFILE CONTEXT:"]
         explicit_file = system_context.get("explicit_input_file")
         detected_files = system_context.get("detected_files_in_directory")
@@ -96,22 +373,17 @@ class CommandGenerator:
         if explicit_file:
             file_context_lines.append(f"- Explicit input file provided: '{explicit_file}' (Use this exact path)")
         if detected_files:
-            relative_files_for_prompt = []
-            for f_abs in detected_files:
-                try:
-                    # Attempt to get relative path for brevity in prompt
-                    rel_path = os.path.relpath(f_abs, cwd)
-                    # Heuristic: Use relative path if shorter and not complex
-                    if len(rel_path) < len(f_abs) and '../' not in rel_path[3:]:
-                        relative_files_for_prompt.append(rel_path)
-                    else:
-                        relative_files_for_prompt.append(f_abs) # Fallback to absolute
-                except ValueError:
-                    # Files might be on different drives (Windows)
-                    log.warning(f"Could not create relative path for '{f_abs}' from CWD '{cwd}'. Using absolute path in prompt context.")
-                    relative_files_for_prompt.append(f_abs) # Use absolute path
-
-            files_list_str = ", ".join([f"'{f}'" for f in relative_files_for_prompt])
+            # Show files under the CWD relative to it for brevity in the prompt. The CWD
+            # prefix is normalized once rather than calling os.path.relpath per file;
+            # anything outside the CWD keeps its absolute path.
+            cwd_prefix = os.path.join(os.path.normpath(cwd), "")
+            prefix_len = len(cwd_prefix)
+            relative_files_for_prompt = [
+                f_abs[prefix_len:] if f_abs.startswith(cwd_prefix) else f_abs
+                for f_abs in detected_files
+            ]
+
+            files_list_str = ", ".join(f"'{f}'" for f in relative_files_for_prompt)
             # Include CWD in message for clarity
             file_context_lines.append(f"- Media files found in directory '{cwd}': {files_list_str}")
             if detected_files: # Add note only if files were actually detected
@@ -146,69 +418,115 @@ class CommandGenerator:
             ValueError: If the system context dictionary is missing required keys
                         for prompt formatting.
         """
-        # Format the dynamic file context part
-        file_context_str = self._format_file_context(system_context)
-
-        # Construct the final system prompt
+        # Construct the static system prompt (memoized on the machine-level fields only)
         try:
-            formatted_system_prompt = self.system_prompt_template.format(
-                os_info=system_context.get('os_info', 'Unknown'),
-                os_type=system_context.get('os_type', 'Unknown'),
-                shell=system_context.get('shell', 'Unknown'),
-                ffmpeg_version=system_context.get('ffmpeg_version', 'Unknown'),
-                ffmpeg_executable_path=system_context.get('ffmpeg_executable_path', 'ffmpeg'),
-                current_directory=system_context.get("current_directory", "."),
-                file_context=file_context_str
+            static_system_prompt = self._render_system_prompt(
+                self._compiled_prompt, _ctx_key(system_context, _STATIC_PROMPT_FIELDS)
             )
         except KeyError as e:
             log.error(f"Missing key in system_context for prompt formatting: {e}")
             # Raise a clear ValueError to be handled upstream
             raise ValueError(f"System context dictionary is missing required key: {e}") from e
         except AttributeError:
-             # This might happen if self.system_prompt_template wasn't loaded correctly
+             # This might happen if the system prompt template wasn't loaded correctly
              log.error("System prompt template is not loaded. Cannot format messages.")
              raise RuntimeError("System prompt template failed to load during initialization.")
 
+        # The working-directory details change between runs, so they follow the
+        # static prompt in their own message to keep the shared prefix intact.
+        working_context = _WORKING_CONTEXT_HEADER.format(
+            current_directory=system_context.get("current_directory", ".")
+        ) + self._format_file_context(system_context)
 
-        messages = [{"role": "system", "content": formatted_system_prompt}]
+        messages = [
+            {"role": "system", "content": static_system_prompt},
+            {"role": "system", "content": working_context},
+        ]
         # Filter out empty user messages if any crept in
         valid_history = [msg for msg in conversation_history if msg.get("content")]
         messages.extend(valid_history) # Add user prompts, assistant responses, errors etc.
 
         return messages
 
-    def _call_llm_api(self, messages: list[dict[str, str]]) -> str:
+    def _finalize_content(self, content: str) -> str:
+        """
+        Logs the assembled LLM content and substitutes a parsable failure
+        payload when the model returned nothing.
+        """
+        log.debug("LLM raw choice content: %s", content)
+
+        if not content:
+            log.warning("LLM returned empty content.")
+            # Return structure indicating failure but parsable by clean_json_response/orjson.loads
+            return orjson.dumps({"explanation": ["LLM returned empty content."], "command": ""}).decode()
+
+        return content
+
+    @staticmethod
+    @functools.lru_cache(maxsize=32)
+    def _render_system_prompt(compiled_prompt: tuple, static_key: tuple) -> str:
         """
-        Calls the OpenAI Chat Completion API.
+        Renders the precompiled static system prompt from the machine-level context.
+        Raises KeyError if the template references a field not supplied here.
+        """
+        system_context = dict(static_key)
+        return _render_template(compiled_prompt, {
+            "os_info": system_context.get('os_info', 'Unknown'),
+            "os_type": system_context.get('os_type', 'Unknown'),
+            "shell": system_context.get('shell', 'Unknown'),
+            "ffmpeg_version": system_context.get('ffmpeg_version', 'Unknown'),
+            "ffmpeg_executable_path": system_context.get('ffmpeg_executable_path', 'ffmpeg'),
+        })
+
+    def _completion_kwargs(self, messages: list[dict[str, str]], model: str) -> dict:
+        """
+        Arguments for a streaming JSON-mode completion, shared by the sync and async
+        calls. Rate limits and transient errors are retried by the client itself
+        (see _LLM_MAX_RETRIES).
+        """
+        # Only serialize the (multi-KB) message list when DEBUG logging is actually enabled
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("Sending messages to LLM (model: %s): %s", model, orjson.dumps(messages, option=orjson.OPT_INDENT_2).decode())
+        return {
+            "model": model,
+            "messages": messages,
+            "temperature": self.temperature,
+            "response_format": {"type": "json_object"}, # Request JSON output
+            "stream": True,
+        }
+
+    @_cached_llm_call
+    def _call_llm_api(self, messages: list[dict[str, str]], model: Optional[str] = None) -> str:
+        """
+        Calls the OpenAI Chat Completion API with streaming enabled and
+        assembles the streamed deltas into a single string.
 
         Args:
             messages: The list of messages formatted for the API.
+            model: Optional model override; defaults to the configured model.
 
         Returns:
-            The raw content string from the LLM response.
+            The raw content string from the LLM response. `_cached_llm_call`
+            substitutes a parsable failure payload if it is empty.
 
         Raises:
             openai.* errors: Propagates API-specific errors for handling upstream.
             Exception: Catches and re-raises unexpected errors during the API call.
         """
-        log.debug(f"Sending messages to LLM (model: {self.model}): {json.dumps(messages, indent=2)}")
+        model = model or self.model
         try:
-            # NOTE: Assumes openai.api_key is set globally in the main application
-            response = openai.chat.completions.create(
-                model=self.model,
-                messages=messages,
-                temperature=self.temperature,
-                response_format={"type": "json_object"} # Request JSON output
-            )
-            content = response.choices[0].message.content
-            log.debug(f"LLM raw choice content: {content}")
-
-            if not content:
-                log.warning("LLM returned empty content.")
-                # Return structure indicating failure but parsable by clean_json_response/json.loads
-                return json.dumps({"explanation": ["LLM returned empty content."], "command": ""})
-
-            return content
+            response = self._get_client().chat.completions.create(**self._completion_kwargs(messages, model))
+            # Assemble the streamed deltas, stopping as soon as the JSON object closes
+            # so we don't wait on trailing tokens we would discard anyway.
+            buf: list[str] = []
+            scanner = _JsonObjectScanner()
+            try:
+                for chunk in response:
+                    if _consume_delta(buf, scanner, chunk):
+                        break
+            finally:
+                response.close()
+            return "".join(buf)
 
         # Specific OpenAI errors are NOT caught here - they will propagate up
         # to be handled by the main application logic (e.g., toast.py)
@@ -217,6 +535,113 @@ class CommandGenerator:
             log.exception("Unexpected error during OpenAI API call:") # Log traceback
             raise # Re-raise the exception to be handled upstream
 
+    def _get_client(self) -> "openai.OpenAI":
+        """
+        Returns the shared OpenAI client, creating it on first use. The client keeps
+        a pooled (HTTP/2 when available) connection so later calls skip TCP/TLS setup.
+        """
+        if self._client is None:
+            import httpx
+            import openai
+            # NOTE: Reuses the API key set globally on the openai module by the main application
+            self._client = openai.OpenAI(
+                api_key=openai.api_key,
+                max_retries=_LLM_MAX_RETRIES,
+                http_client=httpx.Client(
+                    http2=_HTTP2_AVAILABLE,
+                    limits=httpx.Limits(max_keepalive_connections=_HTTP_MAX_KEEPALIVE_CONNECTIONS),
+                    timeout=_HTTP_TIMEOUT,
+                ),
+            )
+        return self._client
+
+    def _get_async_client(self) -> "openai.AsyncOpenAI":
+        """
+        Returns the AsyncOpenAI client for the running event loop, creating it on
+        first use. httpx ties its connection pool to the loop it was used on, so a
+        client from a previous loop (e.g., an earlier asyncio.run) is replaced.
+        """
+        loop = asyncio.get_running_loop()
+        if self._aclient is None or self._aclient_loop is not loop:
+            # A client from an earlier loop can't be closed here (its loop may be
+            # gone); drop it and let its connections be garbage collected.
+            import httpx
+            import openai
+            # NOTE: Reuses the API key set globally on the openai module by the main application
+            self._aclient = openai.AsyncOpenAI(
+                api_key=openai.api_key,
+                max_retries=_LLM_MAX_RETRIES,
+                http_client=httpx.AsyncClient(
+                    http2=_HTTP2_AVAILABLE,
+                    limits=httpx.Limits(max_keepalive_connections=_HTTP_MAX_KEEPALIVE_CONNECTIONS),
+                    timeout=_HTTP_TIMEOUT,
+                ),
+            )
+            self._aclient_loop = loop
+        return self._aclient
+
+    def close(self) -> None:
+        """Closes the pooled sync HTTP client and the response cache, if present."""
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+        if self.cache is not None:
+            self.cache.close()
+            self.cache = None
+
+    async def aclose(self) -> None:
+        """
+        Closes the pooled sync and async HTTP clients and the response cache, if
+        present. Call it from the same event loop that used the async client.
+        """
+        self.close()
+        if self._aclient is not None:
+            if self._aclient_loop is asyncio.get_running_loop():
+                await self._aclient.close()
+            self._aclient = None
+            self._aclient_loop = None
+
+    def __del__(self):
+        # Best-effort cleanup; the interpreter may already be tearing modules down.
+        try:
+            self.close()
+        except Exception:
+            pass
+
+    @_cached_llm_call
+    async def _call_llm_api_async(self, messages: list[dict[str, str]], model: Optional[str] = None) -> str:
+        """
+        Async counterpart of `_call_llm_api` using `openai.AsyncOpenAI`.
+
+        Args:
+            messages: The list of messages formatted for the API.
+            model: Optional model override; defaults to the configured model.
+
+        Returns:
+            The raw content string from the LLM response. `_cached_llm_call`
+            substitutes a parsable failure payload if it is empty.
+
+        Raises:
+            openai.* errors: Propagates API-specific errors for handling upstream.
+            Exception: Catches and re-raises unexpected errors during the API call.
+        """
+        model = model or self.model
+        try:
+            response = await self._get_async_client().chat.completions.create(**self._completion_kwargs(messages, model))
+            buf: list[str] = []
+            scanner = _JsonObjectScanner()
+            try:
+                async for chunk in response:
+                    if _consume_delta(buf, scanner, chunk):
+                        break
+            finally:
+                await response.close()
+            return "".join(buf)
+
+        except Exception:
+            log.exception("Unexpected error during async OpenAI API call:") # Log traceback
+            raise # Re-raise the exception to be handled upstream
+
 
     def clean_json_response(self, response_str: str) -> str:
         """
@@ -236,29 +661,77 @@ class CommandGenerator:
 
         response_str = response_str.strip()
 
-        # 1. Remove markdown code blocks (```json ... ``` or ``` ... ```)
-        # Using DOTALL to match across newlines, IGNORECASE for 'json' tag
-        match = re.match(r"^\s*```(?:json)?\s*(.*)\s*```\s*$", response_str, re.DOTALL | re.IGNORECASE)
-        if match:
-             response_str = match.group(1).strip()
+        # 1. Extract the outermost JSON object in one pass. A leading markdown code block
+        # marker (```json) or other non-JSON text LLMs sometimes add is skipped, and anything
+        # after the object is ignored, even if it contains braces.
+        # Further cleaning (e.g., removing trailing commas) could be added here, but the
+        # caller's JSON parser reports any remaining issues. Rely on it for validation.
+        json_object = _extract_json_object(response_str)
+        if json_object is not None:
+            return json_object
+
+        # 2. No object found: at least remove a markdown code block (```json ... ``` or ``` ... ```)
+        # with a single slice, so the caller sees the inner text.
+        if response_str.startswith("```"):
+            first_newline = response_str.find("\n")
+            last_fence = response_str.rfind("```")
+            if first_newline != -1 and last_fence > first_newline:
+                response_str = response_str[first_newline + 1:last_fence].strip()
+
+        # It's likely not a valid JSON object string; parsing will fail later.
+        log.warning("Could not find JSON object boundaries '{...}' in LLM response after cleaning markdown.")
+        return response_str
 
-        # 2. Find the first '{' and the last '}' to define the JSON boundaries
-        # This helps trim potential leading/trailing non-JSON text LLMs sometimes add
-        try:
-            start_index = response_str.index("{")
-            end_index = response_str.rindex("}") + 1
-            response_str = response_str[start_index:end_index]
-        except ValueError:
-            # If no '{' or '}' found, it's likely not a valid JSON object string.
-            log.warning("Could not find JSON object boundaries '{...}' in LLM response after cleaning markdown.")
-            # Return the processed string; parsing will fail later if it's not JSON.
-            return response_str
-
-        # 3. Optional: Further cleaning (e.g., removing trailing commas) could be added here,
-        # but standard json.loads often handles minor issues. Rely on it for validation.
 
-        return response_str
+    def _match_intent(self, conversation_history: list[dict[str, str]], system_context: dict[str, str]) -> Optional[str]:
+        """
+        Answers common single-file requests ("extract audio", "convert to mp4",
+        "make a 720p version") from built-in templates, without calling the LLM.
 
+        Only applies to the first turn (retries after an error always go to the LLM),
+        with an explicit video input file, and on non-Windows systems where the
+        POSIX-quoted paths are safe.
+
+        Returns:
+            A JSON response string in the LLM's format, or None if no intent matched.
+        """
+        input_file = system_context.get("explicit_input_file")
+        if (len(conversation_history) != 1 or conversation_history[-1].get("role") != "user"
+                or not input_file or system_context.get("os_type") == "Windows"):
+            return None
+        stem, input_ext = os.path.splitext(os.path.basename(input_file))
+        if input_ext.lower() not in VIDEO_EXTENSIONS - {".gif"}:
+            return None
+
+        # Normalize the prompt: lowercase, drop the input filename (quoted or not), collapse whitespace
+        query = conversation_history[-1].get("content", "").lower()
+        file_name = os.path.basename(input_file).lower()
+        for mention in (f'"{file_name}"', f"'{file_name}'", file_name):
+            query = query.replace(mention, " ")
+        query = " ".join(query.split()).strip(" .!?")
+
+        for pattern, options, output_ext, explanation in self._intents:
+            if not pattern.fullmatch(query):
+                continue
+            output_file = os.path.join(
+                system_context.get("current_directory", "."), f"{stem}_toasted{output_ext or input_ext}"
+            )
+            command = (
+                f"{shlex.quote(system_context.get('ffmpeg_executable_path', 'ffmpeg'))} "
+                f"-i {shlex.quote(input_file)} {options} {shlex.quote(output_file)} -y"
+            )
+            log.info(f"Matched built-in intent for prompt '{query}'; skipping LLM call.")
+            return orjson.dumps({
+                "explanation": [
+                    "Matched a built-in command template for this request (no LLM call needed).",
+                    f"-i {input_file}: The input file.",
+                    *explanation,
+                    f"{output_file}: Output file, with '_toasted' appended to the name.",
+                    "-y: Overwrite the output file if it exists.",
+                ],
+                "command": command,
+            }).decode()
+        return None
 
     def generate_command(self, conversation_history: list[dict[str, str]], system_context: dict[str, str]) -> str:
         """
@@ -282,6 +755,11 @@ class CommandGenerator:
             FileNotFoundError: If the system prompt template file cannot be loaded.
             RuntimeError: If the system prompt template was not loaded during init.
         """
+        # 0. Answer common single-file requests from built-in templates
+        intent_response = self._match_intent(conversation_history, system_context)
+        if intent_response is not None:
+            return intent_response
+
         # 1. Prepare messages using helper methods
         # Raises ValueError if system_context keys are missing
         # Raises RuntimeError if system_prompt_template isn't loaded
@@ -293,4 +771,48 @@ class CommandGenerator:
         raw_llm_response = self._call_llm_api(messages)
 
         # 3. Return the raw response string (caller will clean and parse)
-        return raw_llm_response
\ No newline at end of file
+        return raw_llm_response
+
+
+    async def generate_command_async(self, conversation_history: list[dict[str, str]], system_context: dict[str, str]) -> str:
+        """
+        Async version of `generate_command`, for use from an event loop.
+
+        Args:
+            conversation_history: The history of the conversation (user prompts, prior results/errors).
+            system_context: Dictionary containing system, file, and environment details.
+
+        Returns:
+            A raw string potentially containing the JSON response from the LLM.
+
+        Raises:
+            Same as `generate_command`.
+        """
+        intent_response = self._match_intent(conversation_history, system_context)
+        if intent_response is not None:
+            return intent_response
+
+        messages = self._prepare_llm_messages(conversation_history, system_context)
+        return await self._call_llm_api_async(messages)
+
+    async def generate_candidates_async(self, conversation_history: list[dict[str, str]], system_context: dict[str, str],
+                                        models: list[str]) -> list[str]:
+        """
+        Requests a command from several models concurrently.
+
+        All requests share the same prepared messages and are issued together,
+        so the wall-clock cost is roughly that of the slowest single call.
+
+        Args:
+            conversation_history: The history of the conversation.
+            system_context: Dictionary containing system, file, and environment details.
+            models: Model names to query (e.g., ["gpt-4o-mini", "gpt-3.5-turbo"]).
+
+        Returns:
+            The raw response strings, in the same order as `models`.
+
+        Raises:
+            Same as `generate_command`; the first failing request's error propagates.
+        """
+        messages = self._prepare_llm_messages(conversation_history, system_context)
+        return list(await asyncio.gather(*(self._call_llm_api_async(messages, model=m) for m in models)))
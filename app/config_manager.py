@@ -22,6 +22,8 @@ LOG_FILE_PATH = CONFIG_DIR / "toast.log"  # Centralized log file location
 DEFAULT_CONFIG = {
     "openai_api_key": None,
     "llm_model": "gpt-4o-mini",  # Default model
+    "llm_temperature": 0.1,
+    "response_cache": True,  # Reuse LLM responses for identical requests (only when llm_temperature is 0)
     "log_level": "INFO",
     "log_to_file": True,
     # Add other future config options here with defaults
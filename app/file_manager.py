@@ -14,6 +14,12 @@ ALL_EXTENSIONS = VIDEO_EXTENSIONS | IMAGE_EXTENSIONS | AUDIO_EXTENSIONS
 # Generate a regex pattern from the supported extensions (removing the dot)
 ext_pattern = '|'.join(re.escape(ext.lstrip('.')) for ext in ALL_EXTENSIONS)
 
+# Query patterns, compiled once at import
+# Quoted filenames (e.g., "filename.mp4")
+QUOTED_FILENAME_RE = re.compile(rf'["\']([^"\']+\.({ext_pattern}))["\']', re.IGNORECASE)
+# Word-like tokens (>= 3 chars); unquoted filenames are the tokens with a media extension
+QUERY_TOKEN_RE = re.compile(r'\b[\w.-]{3,}\b')
+
 class FileManager:
     def __init__(self, directory: str = ".", verbose: bool = False):
         self.directory = os.path.abspath(directory)  # Use absolute path
@@ -27,9 +33,8 @@ class FileManager:
         This is a simple check and might need refinement based on edge cases.
         It prioritizes filenames with extensions.
         """
-        # Regex to find quoted filenames (e.g., "filename.mp4")
-        quoted_pattern = rf'["\']([^"\']+\.({ext_pattern}))["\']'
-        quoted_matches = re.findall(quoted_pattern, user_query, re.IGNORECASE)
+        # Look for quoted filenames first (e.g., "filename.mp4")
+        quoted_matches = QUOTED_FILENAME_RE.findall(user_query)
         if quoted_matches:
             # re.findall returns a list of tuples (filename, extension)
             potential_filename = quoted_matches[0][0]
@@ -39,19 +44,20 @@ class FileManager:
             else:
                 log.debug(f"Found quoted potential filename '{potential_filename}' in query, but it doesn't exist locally.")
 
-        # Regex to find unquoted filenames (more restrictive characters)
-        unquoted_pattern = rf'\b([a-zA-Z0-9_.-]+\.({ext_pattern}))\b'
-        unquoted_matches = re.findall(unquoted_pattern, user_query, re.IGNORECASE)
+        # Tokenize the query once; the tokens serve both the unquoted-filename check
+        # and the exact-match check against local files below.
+        tokens = QUERY_TOKEN_RE.findall(user_query)
+
+        # Unquoted filenames: tokens carrying a supported media extension
+        unquoted_matches = [t for t in tokens if os.path.splitext(t)[1].lower() in ALL_EXTENSIONS]
         if unquoted_matches:
-            for match in unquoted_matches:
-                fname = match[0]  # The full filename
+            for fname in unquoted_matches:
                 potential_file = os.path.join(self.directory, fname)
                 if os.path.isfile(potential_file):
                     return potential_file  # Return full path
-            log.debug(f"Found unquoted potential filenames {[match[0] for match in unquoted_matches]} in query, but none exist locally.")
+            log.debug(f"Found unquoted potential filenames {unquoted_matches} in query, but none exist locally.")
 
         # Basic check: if a token *exactly* matches an existing file (case-insensitive)
-        tokens = re.findall(r'\b[\w.-]{3,}\b', user_query)  # Find words >= 3 chars
         try:
             local_files = {
                 f.lower(): f
@@ -0,0 +1,72 @@
+import os
+import sqlite3
+import logging as log
+from pathlib import Path
+from typing import Optional
+
+VERBOSE = False  # Global verbosity flag for conditional traceback logging
+
+# Follow XDG Base Directory Specification for user-specific cache data
+XDG_CACHE_HOME = os.environ.get('XDG_CACHE_HOME')
+if XDG_CACHE_HOME and os.path.isdir(XDG_CACHE_HOME):
+    CACHE_DIR = Path(XDG_CACHE_HOME) / "pixel-toaster"
+else:
+    # Default fallback: ~/.cache/pixel-toaster
+    CACHE_DIR = Path.home() / ".cache" / "pixel-toaster"
+
+CACHE_DB_PATH = CACHE_DIR / "responses.sqlite3"
+CACHE_MAX_ENTRIES = 1000  # Oldest responses beyond this are pruned on write
+
+log = log.getLogger(__name__)  # Use module-specific logger
+
+
+class ResponseCache:
+    """
+    Persistent key/value store for raw LLM responses, backed by SQLite.
+
+    Keys are content hashes of the request (computed by the caller), values are
+    the raw response strings. Failures to read or write are logged and treated
+    as cache misses so a broken cache never blocks command generation.
+
+    The table is capped at `max_entries` rows; each write drops the least recently
+    written entries beyond that.
+    """
+
+    def __init__(self, db_path: Path = CACHE_DB_PATH, max_entries: int = CACHE_MAX_ENTRIES):
+        self.db_path = Path(db_path)
+        self.max_entries = max_entries
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, value TEXT NOT NULL)"
+        )
+        self._conn.commit()
+        log.debug(f"Response cache opened at {self.db_path}")
+
+    def get(self, key: str) -> Optional[str]:
+        """Returns the cached response for `key`, or None on a miss."""
+        try:
+            row = self._conn.execute("SELECT value FROM responses WHERE key = ?", (key,)).fetchone()
+        except sqlite3.Error as e:
+            log.warning(f"Response cache read failed: {e}", exc_info=VERBOSE)
+            return None
+        return row[0] if row else None
+
+    def set(self, key: str, value: str) -> None:
+        """Stores `value` under `key`, replacing any existing entry, then prunes old entries."""
+        try:
+            # INSERT OR REPLACE re-inserts the row, so rowid order is write order
+            self._conn.execute("INSERT OR REPLACE INTO responses (key, value) VALUES (?, ?)", (key, value))
+            self._conn.execute(
+                "DELETE FROM responses WHERE rowid NOT IN "
+                "(SELECT rowid FROM responses ORDER BY rowid DESC LIMIT ?)",
+                (self.max_entries,),
+            )
+            self._conn.commit()
+        except sqlite3.Error as e:
+            log.warning(f"Response cache write failed: {e}", exc_info=VERBOSE)
+
+    def close(self) -> None:
+        """Closes the underlying database connection."""
+        self._conn.close()
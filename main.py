@@ -43,11 +43,10 @@ logger = log.getLogger()
 try:
     from app import app as toast_app_module
     from app import utils
-    import openai
 except ImportError as e:
     logger.exception("Failed to import core application modules.")
-    utils.eprint(f"[CRITICAL] Failed to import core app modules (app, utils, openai): {e}")
-    utils.eprint("Ensure app/app.py, app/utils.py, etc., exist and required libraries (openai) are installed.")
+    utils.eprint(f"[CRITICAL] Failed to import core app modules (app, utils): {e}")
+    utils.eprint("Ensure app/app.py, app/utils.py, etc., exist and required libraries are installed.")
     sys.exit(1)
 
 def configure_logging(config: Dict[str, Any], verbose: bool):
@@ -131,6 +130,8 @@ def main(sys_args: List[str]):
         sys.exit(1)
 
     try:
+        # Imported here so that --help and argument errors don't pay openai's import cost
+        import openai
         openai.api_key = api_key
         # Maybe add a check here if needed: e.g., list models (can be slow/colog = log.getLogger(__name__)stly)
         # openai.models.list()